@@ -35,21 +35,70 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import collections
 import configparser
+import functools
+import json
+import queue
+import random
+import sys
+import threading
 import time
 import urllib.parse
-import requests
+from operator import itemgetter
+import urllib3
+from urllib3.util.retry import Retry
 import smtplib
 import subprocess
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-
-# Keep track of (derivationStrategy, txid) we've already notified on
-seen_txs = set()
+from email.message import EmailMessage
+
+try:
+    # Optional: fast C ISO 8601 parser, only used where fromisoformat falls short (< 3.11)
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+try:
+    # Optional: faster JSON decoding of NBX responses
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Optional: in-process OpenPGP, avoids forking gpg for every email
+    import pgpy
+except ImportError:
+    pgpy = None
+
+# Keep track of (derivationStrategy, txid) we've already notified on.
+# Bounded LRU (oldest entries evicted first) so a long-running watcher
+# does not grow without limit.
+SEEN_TXS_MAX = 50_000
+seen_txs = collections.OrderedDict()
 # Keep track of derivation strategies (wallets) that have already had at least one tx
 wallets_seen_once = set()
+# Running balance per derivation, confirmed + unconfirmed (mempool) sats, as
+# (balance, as_of_event_id). Snapshots are fetched by the main loop right
+# after the NBX response ending at as_of_event_id (first response, every new
+# block, first tx of a wallet), so they already include every tx announced
+# up to that event; only later txs move the balance by their delta. Only
+# touched by the notification worker.
+wallet_balance_sats = {}
 
 CONFIG_PATH = "/mnt/hdd/app-data/nbx-txwatcher/nbx-txwatcher.conf"
 
+# Read timeout for the events long-poll. NBX holds the request open until an
+# event arrives (or its own long-poll timeout expires), so this must be generous.
+EVENTS_READ_TIMEOUT = 90
+# Retry delay after a failed events poll: doubles per failure up to the max
+EVENTS_BACKOFF_MIN = 1.0
+EVENTS_BACKOFF_MAX = 60.0
+
+# Max jobs waiting for the notification worker before new ones are dropped
+NOTIFY_QUEUE_MAX = 1024
+
 # ---------------------------------------------------------------------------
 # Config helpers
 # ---------------------------------------------------------------------------
@@ -67,80 +116,182 @@ def iter_wallets(config):
         if section.startswith("wallet "):
             yield section, config[section]
 
+@dataclass(frozen=True)
+class MailConfig:
+    """
+    SMTP, address and PGP settings, read once at startup so sending an
+    email does not go back to configparser.
+    """
+    smtp_server: str
+    smtp_port: int
+    smtp_user: str
+    smtp_pass: str
+    mail_from: str
+    mail_to: str
+    pgp_enabled: bool
+    pgp_recipient: str
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            smtp_server=config.get("global", "smtp_server", fallback=None),
+            smtp_port=config.getint("global", "smtp_port", fallback=587),
+            smtp_user=config.get("global", "smtp_user", fallback=None),
+            smtp_pass=config.get("global", "smtp_pass", fallback=None),
+            mail_from=config.get("global", "mail_from", fallback=None),
+            mail_to=config.get("global", "mail_to", fallback=None),
+            pgp_enabled=config.getboolean("global", "pgp_enabled", fallback=False),
+            pgp_recipient=config.get("global", "pgp_recipient", fallback=None),
+        )
+
 # ---------------------------------------------------------------------------
 # NBX helpers
 # ---------------------------------------------------------------------------
 
-def register_derivation(nbx_url, nbx_user, nbx_pass, derivation):
+def make_nbx_http(nbx_user, nbx_pass):
+    """
+    Build a single urllib3.PoolManager shared by all NBX calls.
+
+    The pool keeps connections alive, so the events long-poll and the
+    balance lookups reuse the same socket instead of reconnecting every call.
+    Basic auth, keep-alive and gzip are set once in the default headers.
+    Connection errors and 5xx responses are retried with a short backoff.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    return urllib3.PoolManager(
+        num_pools=1,
+        maxsize=4,
+        headers=urllib3.make_headers(
+            basic_auth=f"{nbx_user}:{nbx_pass}",
+            keep_alive=True,
+            accept_encoding=True,
+        ),
+        retries=retry,
+    )
+
+def raise_for_status(resp):
+    if resp.status >= 400:
+        raise urllib3.exceptions.HTTPError(f"HTTP {resp.status} from NBX")
+
+def decode_json(resp):
+    """
+    Decode an NBX JSON response body, using orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(resp.data)
+    return json.loads(resp.data)
+
+def register_derivation(http, nbx_url, derivation):
     encoded = urllib.parse.quote(derivation, safe='')
     url = f"{nbx_url}/v1/cryptos/BTC/derivations/{encoded}"
     try:
-        resp = requests.post(url, auth=(nbx_user, nbx_pass), timeout=10)
-        if resp.status_code in (200, 201):
-            return True, resp.json() if resp.content else {}
-        elif resp.status_code == 409:
+        resp = http.request("POST", url, timeout=10)
+        if resp.status in (200, 201):
+            return True, decode_json(resp) if resp.data else {}
+        elif resp.status == 409:
             return True, {"status": "already_registered"}
         else:
-            return False, {"status": resp.status_code, "body": resp.text}
+            return False, {"status": resp.status, "body": resp.data.decode("utf-8", errors="replace")}
     except Exception as e:
         return False, {"error": str(e)}
 
-def stream_events(nbx_url, nbx_user, nbx_pass, last_event_id=0):
+def stream_events(http, nbx_url, last_event_id=0):
+    """
+    Long-poll NBX for events and yield each non-empty response as a list.
+
+    Every poll goes through the shared pool, so successive iterations
+    reuse the same keep-alive connection. With longPolling=true NBX only
+    answers once there is something to report, so an idle watcher issues
+    one request per server long-poll window instead of spinning.
+
+    Failed polls are retried with exponential backoff plus random jitter,
+    so watchers do not hammer NBX in lockstep while it is down or restarting.
+    """
     url = f"{nbx_url}/v1/cryptos/BTC/events"
-    params = {"lastEventId": last_event_id, "longPolling": 20}
+    params = {"lastEventId": last_event_id, "longPolling": "true"}
+    timeout = urllib3.Timeout(connect=10, read=EVENTS_READ_TIMEOUT)
+    backoff = EVENTS_BACKOFF_MIN
     while True:
         try:
-            resp = requests.get(
-                url,
-                auth=(nbx_user, nbx_pass),
-                params=params,
-                timeout=30,
-            )
-            resp.raise_for_status()
-            events = resp.json()
+            resp = http.request("GET", url, fields=params, timeout=timeout)
+            raise_for_status(resp)
+            events = decode_json(resp)
+            backoff = EVENTS_BACKOFF_MIN
             if not events:
                 continue
 
+            yield events
             for ev in events:
-                yield ev
                 if "eventId" in ev:
                     params["lastEventId"] = ev["eventId"]
         except Exception as e:
-            print(f"[events] Error: {e}. Sleeping 10s...")
-            time.sleep(10)
+            delay = backoff + random.uniform(0, backoff / 2)
+            print(f"[events] Error: {e}. Sleeping {delay:.1f}s...")
+            time.sleep(delay)
+            backoff = min(EVENTS_BACKOFF_MAX, backoff * 2)
 
-def get_wallet_balance_sats(nbx_url, nbx_user, nbx_pass, derivation):
+def balance_urls(nbx_url, derivation):
     """
-    Query NBXplorer for the wallet's confirmed balance in sats.
-
-    Tries /summary first. If 404, falls back to /balance.
+    Build the (summary_url, balance_url) pair for a derivation.
+    Done once per wallet at startup so balance lookups do no string work.
     """
     encoded = urllib.parse.quote(derivation, safe='')
+    base = f"{nbx_url}/v1/cryptos/BTC/derivations/{encoded}"
+    return f"{base}/summary", f"{base}/balance"
 
+def balance_from_nbx(data):
+    """
+    Confirmed + unconfirmed balance in sats from an NBX /summary or /balance response.
+    """
+    if "total" in data:
+        return int(data["total"])
+    for confirmed_key, unconfirmed_key in (("confirmedBalance", "unconfirmedBalance"),
+                                           ("confirmed", "unconfirmed")):
+        if confirmed_key in data:
+            return int(data[confirmed_key]) + int(data.get(unconfirmed_key) or 0)
+    return 0
+
+def get_wallet_balance_sats(http, urls):
+    """
+    Query NBXplorer for the wallet's balance in sats, including unconfirmed
+    (mempool) transactions NBX has already seen.
+
+    `urls` is the wallet's (summary_url, balance_url) from balance_urls().
+    Tries /summary first. If 404, falls back to /balance.
+    Returns None if NBX could not be queried.
+    """
+    url_summary, url_balance = urls
     # First try /summary
-    url_summary = f"{nbx_url}/v1/cryptos/BTC/derivations/{encoded}/summary"
     try:
-        resp = requests.get(url_summary, auth=(nbx_user, nbx_pass), timeout=10)
-        if resp.status_code == 404:
+        resp = http.request("GET", url_summary, timeout=10)
+        if resp.status == 404:
             # Fall back to /balance
-            url_balance = f"{nbx_url}/v1/cryptos/BTC/derivations/{encoded}/balance"
-            resp2 = requests.get(url_balance, auth=(nbx_user, nbx_pass), timeout=10)
-            resp2.raise_for_status()
-            data2 = resp2.json()
-            # Old-style /balance response typically has "confirmed" or "unconfirmed"
-            if "confirmedBalance" in data2:
-                return int(data2.get("confirmedBalance", 0))
-            elif "confirmed" in data2:
-                return int(data2.get("confirmed", 0))
-            else:
-                return 0
+            resp2 = http.request("GET", url_balance, timeout=10)
+            raise_for_status(resp2)
+            # Old-style /balance response has "confirmed"/"unconfirmed"/"total"
+            return balance_from_nbx(decode_json(resp2))
         else:
-            resp.raise_for_status()
-            data = resp.json()
-            return int(data.get("confirmedBalance", 0))
+            raise_for_status(resp)
+            return balance_from_nbx(decode_json(resp))
     except Exception as e:
         print(f"[balance] Error fetching balance for derivation: {e}")
-        return 0
+        return None
+
+def fetch_wallet_balances(http, wallet_urls):
+    """
+    Fetch a balance snapshot from NBX for every derivation in wallet_urls
+    (derivation -> balance_urls() pair).
+
+    Returns {derivation: sats}, with None for wallets whose balance cannot be
+    fetched; those are dropped from the cache and fetched again on their
+    next transaction.
+    """
+    return {deriv: get_wallet_balance_sats(http, urls) for deriv, urls in wallet_urls.items()}
 
 def is_first_seen_unconfirmed_tx(ev):
     """
@@ -159,11 +310,29 @@ def is_first_seen_unconfirmed_tx(ev):
 # Amount / direction helpers (sats -> BTC)
 # ---------------------------------------------------------------------------
 
-def sats_to_btc(sats):
-    return sats / 100_000_000
+def format_sats_as_btc(sats):
+    """
+    Format an integer amount of sats as BTC with 8 decimals, e.g. 24551 -> "0.00024551".
+    Pure integer arithmetic: exact for any balance, no float rounding.
+    """
+    neg = "-" if sats < 0 else ""
+    sats = abs(sats)
+    return f"{neg}{sats // 100_000_000}.{sats % 100_000_000:08d}"
 
-def format_btc(amount_btc):
-    return f"{amount_btc:.8f}"
+
+_get_value = itemgetter("value")
+
+def sum_values_sats(items):
+    """
+    Sum the "value" (sats) of NBX inputs/outputs.
+
+    NBX emits integer values, so map(itemgetter) sums them without a Python
+    frame per element. Missing or string values take the tolerant slow path.
+    """
+    try:
+        return sum(map(_get_value, items))
+    except (KeyError, TypeError):
+        return sum(int(i.get("value", 0)) for i in items)
 
 
 def infer_direction_and_amount_sats(ev):
@@ -188,8 +357,8 @@ def infer_direction_and_amount_sats(ev):
     inputs = data.get("inputs", []) or []
     outputs = data.get("outputs", []) or []
 
-    sum_inputs = sum(int(i.get("value", 0)) for i in inputs)
-    sum_outputs = sum(int(o.get("value", 0)) for o in outputs)
+    sum_inputs = sum_values_sats(inputs)
+    sum_outputs = sum_values_sats(outputs)
 
     net_delta = sum_outputs - sum_inputs  # positive if wallet gains, negative if loses
 
@@ -209,25 +378,66 @@ def infer_direction_and_amount_sats(ev):
 # Time stamp Helper
 # ---------------------------------------------------------------------------
 
+# strptime formats for the fallback parser: with microseconds, then without
+NBX_TIMESTAMP_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+# Last format in NBX_TIMESTAMP_FORMATS that parsed successfully
+_timestamp_format_cache = [None]
+
 def parse_nbx_timestamp(ts_str):
     """
     Parse NBX timestamp (ISO 8601 / RFC3339-like) into a timezone-aware UTC datetime.
     NBX typically uses e.g. "2025-11-21T17:59:30.123Z" or "2025-11-21T17:59:30Z".
+
+    datetime.fromisoformat (C implementation) handles these directly on
+    Python 3.11+; older interpreters fall back to ciso8601 or strptime.
     """
-    if not ts_str:
+    if not ts_str or not isinstance(ts_str, str):
         return None
+    iso_str = ts_str[:-1] + "+00:00" if ts_str.endswith("Z") else ts_str
     try:
-        # Strip trailing Z and parse
-        if ts_str.endswith("Z"):
-            ts_str = ts_str[:-1]
-        # Try with microseconds
+        dt = datetime.fromisoformat(iso_str)
+    except (ValueError, TypeError):
+        dt = _parse_nbx_timestamp_fallback(ts_str)
+        if dt is None:
+            return None
+    # Timestamps without an offset are UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _parse_nbx_timestamp_fallback(ts_str):
+    """
+    Slow path for interpreters whose fromisoformat rejects the NBX format.
+    Returns a (possibly naive) datetime or None.
+    """
+    if ciso8601 is not None:
         try:
-            dt = datetime.strptime(ts_str, "%Y-%m-%dT%H:%M:%S.%f")
+            return ciso8601.parse_datetime(ts_str)
         except ValueError:
-            dt = datetime.strptime(ts_str, "%Y-%m-%dT%H:%M:%S")
-        return dt.replace(tzinfo=timezone.utc)
-    except Exception:
-        return None
+            return None
+    # Strip trailing Z and parse
+    if ts_str.endswith("Z"):
+        ts_str = ts_str[:-1]
+
+    # NBX uses one shape per server version: try the last format that worked first
+    cached_fmt = _timestamp_format_cache[0]
+    if cached_fmt is not None:
+        try:
+            return datetime.strptime(ts_str, cached_fmt)
+        except ValueError:
+            pass
+
+    for fmt in NBX_TIMESTAMP_FORMATS:
+        if fmt == cached_fmt:
+            continue
+        try:
+            dt = datetime.strptime(ts_str, fmt)
+        except ValueError:
+            continue
+        _timestamp_format_cache[0] = fmt
+        return dt
+    return None
 
 
 def get_event_utc_datetime(event_data):
@@ -248,24 +458,29 @@ def get_event_utc_datetime(event_data):
     return datetime.now(timezone.utc)
 
 
-def format_dates_for_email(config, dt_utc):
+EMAIL_DATE_FMT = "%d/%b/%y %H:%M:%S"  # 22/Nov/25 23:45:15
+
+def format_dates_for_email(dt_utc, tz_offset, tz_label):
     """
     Returns two strings formatted as:
     - UTC:   22/Nov/25 23:45:15
     - Local: 22/Nov/25 20:45:15  (label from config)
-    """
-    offset_hours = config.getfloat("global", "timezone_offset_hours", fallback=0.0)
-    tz_label = config.get("global", "timezone_label", fallback="Local")
 
-    offset = timedelta(hours=offset_hours)
-    dt_local = dt_utc + offset
-
-    fmt = "%d/%b/%y %H:%M:%S"  # 22/Nov/25 23:45:15
+    tz_offset (timedelta) and tz_label are read from the config once in main().
+    """
+    utc_str, local_str = _format_email_dates(int(dt_utc.timestamp()), tz_offset.total_seconds())
+    return utc_str, local_str, tz_label
 
-    utc_str = dt_utc.strftime(fmt)
-    local_str = dt_local.strftime(fmt)
 
-    return utc_str, local_str, tz_label
+@functools.lru_cache(maxsize=4096)
+def _format_email_dates(ts, offset_seconds):
+    """
+    strftime both dates for a whole-second UTC timestamp. Memoized, since
+    events from the same block or burst usually share their timestamp.
+    """
+    dt_utc = datetime.fromtimestamp(ts, timezone.utc)
+    dt_local = dt_utc + timedelta(seconds=offset_seconds)
+    return dt_utc.strftime(EMAIL_DATE_FMT), dt_local.strftime(EMAIL_DATE_FMT)
 
 # ---------------------------------------------------------------------------
 # PGP + Email
@@ -274,17 +489,54 @@ def format_dates_for_email(config, dt_utc):
 import smtplib
 import subprocess
 
-def pgp_encrypt_if_enabled(config, plaintext):
+def load_pgp_key(config):
+    """
+    Load the recipient public key from [global] pgp_pubkey_file once at startup.
+
+    Returns a pgpy.PGPKey, or None when PGP is disabled, no key file is
+    configured, pgpy is not installed or the key cannot be read. In that case
+    pgp_encrypt_if_enabled falls back to the gpg binary.
+    """
+    if not config.getboolean("global", "pgp_enabled", fallback=False):
+        return None
+
+    key_file = config.get("global", "pgp_pubkey_file", fallback="")
+    if not key_file:
+        return None
+    if pgpy is None:
+        print("[pgp] pgp_pubkey_file is set but pgpy is not installed; using gpg.")
+        return None
+
+    try:
+        key, _ = pgpy.PGPKey.from_file(key_file)
+    except Exception as e:
+        print(f"[pgp] Failed to load {key_file}: {e}; using gpg.")
+        return None
+    print(f"[pgp] Loaded recipient key {key.fingerprint} from {key_file}")
+    return key
+
+
+def pgp_encrypt_if_enabled(mail_config, plaintext, pgp_key=None):
     """
     If [global] pgp_enabled = true, encrypts plaintext with pgp_recipient
     and returns (encrypted_ascii_armor, True).
     Otherwise returns (plaintext, False).
+
+    If a pgp_key preloaded by load_pgp_key is given, encryption happens
+    in-process with it instead of running gpg.
     """
-    enabled = config.getboolean("global", "pgp_enabled", fallback=False)
-    if not enabled:
+    if not mail_config.pgp_enabled:
         return plaintext, False
 
-    pgp_recipient = config.get("global", "pgp_recipient", fallback=None)
+    if pgp_key is not None:
+        try:
+            encrypted = pgp_key.encrypt(pgpy.PGPMessage.new(plaintext))
+            return str(encrypted), True
+        except Exception as e:
+            print(f"[pgp] Encryption failed: {e}")
+            return plaintext, False
+
+    pgp_recipient = mail_config.pgp_recipient
     if not pgp_recipient:
         print("[pgp] pgp_enabled=true but pgp_recipient is empty; sending unencrypted.")
         return plaintext, False
@@ -307,47 +559,113 @@ def pgp_encrypt_if_enabled(config, plaintext):
         return plaintext, False
 
 
-def send_email(config, subject, body_text):
+class MailSender:
     """
-    Sends a plain-text email using the exact raw message format that worked with ProtonMail PGP.
-    If PGP is enabled, body_text is replaced by ASCII-armored GPG output.
+    Keeps one authenticated SMTP connection open across notifications.
+
+    The connection is opened lazily on the first send. Before each send it is
+    probed with NOOP and transparently re-established (STARTTLS + LOGIN) if the
+    server dropped it, so the handshake cost is paid once, not per email.
     """
-    smtp_server = config.get("global", "smtp_server", fallback=None)
-    smtp_port   = config.getint("global", "smtp_port", fallback=587)
-    smtp_user   = config.get("global", "smtp_user", fallback=None)
-    smtp_pass   = config.get("global", "smtp_pass", fallback=None)
-    mail_from   = config.get("global", "mail_from", fallback=None)
-    mail_to     = config.get("global", "mail_to", fallback=None)
 
-    if not (smtp_server and smtp_user and smtp_pass and mail_from and mail_to):
+    def __init__(self, mail_config):
+        self.mail_config = mail_config
+        self.conn = None
+
+    def is_configured(self):
+        mc = self.mail_config
+        return bool(mc.smtp_server and mc.smtp_user and mc.smtp_pass
+                    and mc.mail_from and mc.mail_to)
+
+    def _connect(self):
+        mc = self.mail_config
+        conn = smtplib.SMTP(mc.smtp_server, mc.smtp_port, timeout=20)
+        try:
+            conn.starttls()
+            conn.login(mc.smtp_user, mc.smtp_pass)
+        except Exception:
+            conn.close()
+            raise
+        self.conn = conn
+
+    def _is_alive(self):
+        try:
+            code, _ = self.conn.noop()
+            return code == 250
+        except (smtplib.SMTPServerDisconnected, OSError):
+            return False
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.conn.quit()
+        except (smtplib.SMTPException, OSError):
+            self.conn.close()
+        self.conn = None
+
+    def send(self, mail_from, mail_to, msg):
+        if self.conn is not None and not self._is_alive():
+            self.close()
+        if self.conn is None:
+            self._connect()
+        try:
+            self.conn.send_message(msg, mail_from, [mail_to])
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between NOOP and DATA; reconnect once and retry
+            self.conn = None
+            self._connect()
+            self.conn.send_message(msg, mail_from, [mail_to])
+
+
+def send_email(mailer, subject, body_text, pgp_key=None):
+    """
+    Sends a single-part text/plain (utf-8) email, the format that worked with ProtonMail PGP.
+    If PGP is enabled, body_text is replaced by ASCII-armored GPG output.
+
+    EmailMessage takes care of CRLF line endings, header encoding/folding
+    and the Content-Transfer-Encoding.
+    """
+    if not mailer.is_configured():
         print("[email] Missing SMTP or mail_from/mail_to configuration; cannot send email.")
         return
 
-    final_body, is_encrypted = pgp_encrypt_if_enabled(config, body_text)
+    mail_from = mailer.mail_config.mail_from
+    mail_to = mailer.mail_config.mail_to
+    final_body, is_encrypted = pgp_encrypt_if_enabled(mailer.mail_config, body_text, pgp_key)
 
-    raw_msg = f"""From: {mail_from}
-To: {mail_to}
-Subject: {subject}
-MIME-Version: 1.0
-Content-Type: text/plain; charset=utf-8
-Content-Transfer-Encoding: 7bit
-
-{final_body}
-"""
+    msg = EmailMessage()
+    msg["From"] = mail_from
+    msg["To"] = mail_to
+    msg["Subject"] = subject
+    msg.set_content(final_body)
 
     try:
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=20) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(mail_from, [mail_to], raw_msg.encode("utf-8"))
+        mailer.send(mail_from, mail_to, msg)
         print(f"[email] Sent to {mail_to}: {subject} (encrypted={is_encrypted})")
     except Exception as e:
         print(f"[email] Error sending email: {e}")
+        # Start from a fresh connection next time
+        mailer.close()
 
 # ---------------------------------------------------------------------------
 # Message formatting
 # ---------------------------------------------------------------------------
 
+# Fixed part of the body (header + amounts blocks), filled in one format pass
+TX_MESSAGE_TEMPLATE = (
+    "----------------------------------\n"
+    "Wallet:       {wallet}\n"
+    "Direction:    {direction}\n"
+    "Date (UTC):   {utc}\n"
+    "Date ({tz_label}): {local}\n"
+    "----------------------------------\n"
+    "Original:     {original} BTC\n"
+    "Transaction: {sign}{amount} BTC\n"
+    "Balance:      {balance} BTC\n"
+    "----------------------------------"
+)
+
 def format_tx_message(wallet_name, direction, amount_sats,
                       local_explorer, public_explorer, txid,
                       ending_balance_sats, utc_str, local_str, tz_label,
@@ -372,53 +690,136 @@ def format_tx_message(wallet_name, direction, amount_sats,
     https://mempool.space/tx/<txid>
     """
 
-    amount_btc = sats_to_btc(amount_sats)
-    ending_btc = sats_to_btc(ending_balance_sats)
-
     # Infer original balance from ending balance +/- tx amount
     if direction == "Inbound":
-        orig_btc = ending_btc - amount_btc
+        orig_sats = ending_balance_sats - amount_sats
         sign = "+"
     elif direction == "Outbound":
-        orig_btc = ending_btc + amount_btc
+        orig_sats = ending_balance_sats + amount_sats
         sign = "-"
     else:
-        orig_btc = ending_btc
+        orig_sats = ending_balance_sats
         sign = " "
 
-    # Header block
-    lines = []
-    lines.append("----------------------------------")
-    lines.append(f"Wallet:       {wallet_name}")
-    lines.append(f"Direction:    {direction}")
-    lines.append(f"Date (UTC):   {utc_str}")
-    lines.append(f"Date ({tz_label}): {local_str}")
-    lines.append("----------------------------------")
-
-    # Amounts block
-    lines.append(f"Original:     {format_btc(orig_btc)} BTC")
-    lines.append(f"Transaction: {sign}{format_btc(amount_btc)} BTC")
-    lines.append(f"Balance:      {format_btc(ending_btc)} BTC")
-    lines.append("----------------------------------")
+    body = TX_MESSAGE_TEMPLATE.format_map({
+        "wallet": wallet_name,
+        "direction": direction,
+        "utc": utc_str,
+        "tz_label": tz_label,
+        "local": local_str,
+        "original": format_sats_as_btc(orig_sats),
+        "sign": sign,
+        "amount": format_sats_as_btc(amount_sats),
+        "balance": format_sats_as_btc(ending_balance_sats),
+    })
 
     # URLs
     if local_explorer:
-        base = local_explorer.rstrip("/")
-        lines.append(f"{base}/tx/{txid}")
+        body += f"\n{local_explorer.rstrip('/')}/tx/{txid}"
     if public_explorer:
-        base = public_explorer.rstrip("/")
-        lines.append(f"{base}/tx/{txid}")
+        body += f"\n{public_explorer.rstrip('/')}/tx/{txid}"
 
     # Note to warn about potential incorrect balance if first ever seen transaction
     if note:
-        lines.append("")
-        lines.append(note)
+        body += f"\n\n{note}"
+
+    return body
+
+
+# ---------------------------------------------------------------------------
+# Notification worker
+# ---------------------------------------------------------------------------
+
+def notify_worker(jobs):
+    """
+    Run queued (func, args) jobs one at a time, in order, until a None
+    sentinel is received.
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        func, args = job
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"[notify] Error in {func.__name__}: {e}")
+
+
+def enqueue_job(jobs, func, *args):
+    """
+    Hand a job to the notification worker without blocking the event loop.
+    If the worker has fallen NOTIFY_QUEUE_MAX jobs behind, the job is dropped.
+    """
+    try:
+        jobs.put_nowait((func, args))
+    except queue.Full:
+        print(f"[notify] Queue full ({NOTIFY_QUEUE_MAX} jobs); dropping {func.__name__}")
 
-    return "\n".join(lines)
 
+def notify_batch(mailer, pgp_key, tz_offset, tz_label, local_explorer, public_explorer,
+                 snapshot, as_of_event_id, txs):
+    """
+    Apply the balance snapshot taken for one NBX response, then notify every
+    transaction collected from it.
 
-    return "\n".join(lines)
+    Runs on the notification worker so the event stream is never blocked by
+    gpg or SMTP. The ending balance is the cached wallet balance plus this
+    tx's delta, unless the cached snapshot was taken after this tx's event
+    and so already includes it.
+    """
+    for deriv, balance in snapshot.items():
+        if balance is None:
+            wallet_balance_sats.pop(deriv, None)
+        else:
+            wallet_balance_sats[deriv] = (balance, as_of_event_id)
+
+    for deriv, event_id, wallet_name, txid, direction, amount_sats, dt_utc, note in txs:
+        cached = wallet_balance_sats.get(deriv)
+        if cached is None:
+            # NBX unreachable and nothing cached
+            ending_balance_sats = 0
+        else:
+            balance, as_of = cached
+            if as_of is None or event_id is None or event_id > as_of:
+                if direction == "Inbound":
+                    balance += amount_sats
+                elif direction == "Outbound":
+                    balance -= amount_sats
+                wallet_balance_sats[deriv] = (balance, as_of)
+            ending_balance_sats = balance
+
+        notify_tx(mailer, pgp_key, tz_offset, tz_label, local_explorer, public_explorer,
+                  wallet_name, txid, direction, amount_sats, ending_balance_sats, dt_utc, note)
+
+
+def notify_tx(mailer, pgp_key, tz_offset, tz_label, local_explorer, public_explorer,
+              wallet_name, txid, direction, amount_sats, ending_balance_sats, dt_utc, note):
+    """
+    Build the message for one transaction and send the email.
+    """
+    try:
+        utc_str, local_str, tz_label = format_dates_for_email(dt_utc, tz_offset, tz_label)
+
+        body = format_tx_message(
+            wallet_name,
+            direction,
+            amount_sats,
+            local_explorer,
+            public_explorer,
+            txid,
+            ending_balance_sats,
+            utc_str,
+            local_str,
+            tz_label,
+            note,
+        )
 
+        subject = f"[{wallet_name}] Transaction in Monitored Wallet"
+
+        send_email(mailer, subject, body, pgp_key)
+    except Exception as e:
+        print(f"[notify] Error notifying txid={txid}: {e}")
 
 # ---------------------------------------------------------------------------
 # Main watcher
@@ -450,9 +851,17 @@ def main():
         nbx_user = get_global(config, "nbx_user")
         nbx_pass = get_global(config, "nbx_pass")
 
+    # One pooled keep-alive connection manager for every NBX request
+    http = make_nbx_http(nbx_user, nbx_pass)
+
     local_explorer  = get_global(config, "local_explorer_url", fallback="")
     public_explorer = get_global(config, "explorer_url", fallback="")
 
+    # Per-notification settings, read once instead of per event
+    tz_offset = timedelta(hours=config.getfloat("global", "timezone_offset_hours", fallback=0.0))
+    tz_label = get_global(config, "timezone_label", fallback="Local")
+    mail_config = MailConfig.from_config(config)
+
     # 2. Register derivations (single-sig only)
     print("2. Registering derivations...")
     for section, wcfg in iter_wallets(config):
@@ -471,100 +880,166 @@ def main():
             print(f"   {section} ({name}): Missing 'xpub' or 'derivation', skipping.")
             continue
 
-        ok, info = register_derivation(nbx_url, nbx_user, nbx_pass, derivation_string)
+        ok, info = register_derivation(http, nbx_url, derivation_string)
         if ok:
             print("      ✓ registered (or already registered)")
         else:
             print(f"      ✗ failed: {info}")
 
-    # 3. Build derivation -> wallet name map
+    # 3. Build derivation -> (wallet name, (summary_url, balance_url)) map
+    # Keys are interned and the balance URLs are built once here, not per event.
     deriv_to_wallet = {}
     for section, wcfg in iter_wallets(config):
         name = wcfg.get("name", section)
         xpub = wcfg.get("xpub", "").strip()
         derivation_fixed = wcfg.get("derivation", "").strip()
 
-        if derivation_fixed:
-            deriv_to_wallet[derivation_fixed] = name
-        elif xpub:
-            deriv_to_wallet[xpub] = name
+        deriv = derivation_fixed or xpub
+        if deriv:
+            deriv_to_wallet[sys.intern(deriv)] = (name, balance_urls(nbx_url, deriv))
+
+    # Starting balances are fetched after the first NBX response rather than
+    # here: streaming starts at lastEventId=0, so that response replays every
+    # tx NBX still has, and a snapshot taken before it would get those deltas
+    # added on top of a total that already includes them.
+    wallet_urls = {deriv: urls for deriv, (_, urls) in deriv_to_wallet.items()}
+    # Derivations with a balance snapshot in the cache (as far as the main loop knows)
+    balance_tracked = set()
+    first_response = True
 
     print("\n3. Streaming events from NBX... (Ctrl+C to stop)\n")
 
+    # Single worker thread: notifications stay in order, while the long-poll
+    # only dedupes and enqueues, so a slow SMTP server never stalls it.
+    jobs = queue.Queue(maxsize=NOTIFY_QUEUE_MAX)
+    worker = threading.Thread(target=notify_worker, args=(jobs,), name="notify", daemon=True)
+    worker.start()
+    # SMTP connection kept open across notifications (used by the worker only)
+    mailer = MailSender(mail_config)
+    # Recipient key parsed once, if pgp_pubkey_file is configured
+    pgp_key = load_pgp_key(config)
+
     try:
-        for ev in stream_events(nbx_url, nbx_user, nbx_pass):
-            etype = ev.get("type")
-
-
-            if etype == "newtransaction":
-                # Only handle the initial broadcast (0 confirmations)
-                if not is_first_seen_unconfirmed_tx(ev):
-                    # Uncomment if you want to see when confirmations are ignored:
-                    print(f"[tx] id={ev.get('eventId')} (confirmed update, ignored)")
-                    continue
-
-                data = ev.get("data", {})
-                deriv = data.get("derivationStrategy", "")
-                wallet_name = deriv_to_wallet.get(deriv, "UNKNOWN WALLET")
-                txid = data.get("transactionData", {}).get("transactionHash", "")
-
-                # Dedupe: skip if we've already notified this wallet+txid
-                key = (deriv, txid)
-                if key in seen_txs:
-                    print(f"[tx] id={ev.get('eventId')} wallet={wallet_name} txid={txid} (duplicate, skipped)")
-                    continue
-                seen_txs.add(key)
-
-                direction, amount_sats = infer_direction_and_amount_sats(ev)
-
-                # Real wallet ending balance
-                ending_balance_sats = get_wallet_balance_sats(nbx_url, nbx_user, nbx_pass, deriv)
-
-                # Timestamp handling
-                dt_utc = get_event_utc_datetime(data)
-                utc_str, local_str, tz_label = format_dates_for_email(config, dt_utc)
-
-
-                # Determine whether this is the first transaction we observe for this wallet
-                note = None
-                if deriv not in wallets_seen_once:
-                    wallets_seen_once.add(deriv)
-                    note = (
-                        "Note: This is the first transaction observed for this wallet by nbx-txwatcher; "
-                        "earlier history may not be fully reflected in the Original/Balance values."
+        for events in stream_events(http, nbx_url):
+            # Transactions to notify from this response, handed to the worker together
+            pending = []
+            pending_urls = {}
+            new_block = False
+            for ev in events:
+                etype = ev.get("type")
+
+
+                if etype == "newtransaction":
+                    # Only handle the initial broadcast (0 confirmations)
+                    if not is_first_seen_unconfirmed_tx(ev):
+                        # Uncomment if you want to see when confirmations are ignored:
+                        print(f"[tx] id={ev.get('eventId')} (confirmed update, ignored)")
+                        continue
+
+                    data = ev.get("data", {})
+                    deriv = data.get("derivationStrategy", "")
+                    wallet = deriv_to_wallet.get(deriv)
+                    if wallet is not None:
+                        wallet_name, urls = wallet
+                    else:
+                        wallet_name, urls = "UNKNOWN WALLET", balance_urls(nbx_url, deriv)
+                    txid = data.get("transactionData", {}).get("transactionHash", "")
+
+                    # Dedupe: skip if we've already notified this wallet+txid
+                    key = (deriv, txid)
+                    if key in seen_txs:
+                        seen_txs.move_to_end(key)
+                        print(f"[tx] id={ev.get('eventId')} wallet={wallet_name} txid={txid} (duplicate, skipped)")
+                        continue
+                    seen_txs[key] = None
+                    if len(seen_txs) > SEEN_TXS_MAX:
+                        seen_txs.popitem(last=False)
+
+                    direction, amount_sats = infer_direction_and_amount_sats(ev)
+
+                    # Timestamp handling
+                    dt_utc = get_event_utc_datetime(data)
+
+                    # Determine whether this is the first transaction we observe for this wallet
+                    note = None
+                    if deriv not in wallets_seen_once:
+                        wallets_seen_once.add(deriv)
+                        note = (
+                            "Note: This is the first transaction observed for this wallet by nbx-txwatcher; "
+                            "earlier history may not be fully reflected in the Original/Balance values."
+                        )
+
+
+                    print(f"[tx] id={ev.get('eventId')} wallet={wallet_name} dir={direction} amount={amount_sats} sats")
+                    print(f"     txid={txid}")
+
+                    pending.append(
+                        (deriv, ev.get("eventId"), wallet_name, txid, direction, amount_sats, dt_utc, note)
                     )
-
-
-                body = format_tx_message(
-                    wallet_name,
-                    direction,
-                    amount_sats,
+                    pending_urls[deriv] = urls
+
+                elif etype == "newblock":
+                    data = ev.get("data", {})
+                    height = data.get("height")
+                    blockhash = data.get("hash", "")[:16]
+                    print(f"[block] height={height} hash={blockhash}...")
+                    new_block = True
+                else:
+                    print(f"[event] id={ev.get('eventId')} type={etype}")
+
+            # Balance snapshots are taken here, right after the response, so
+            # they line up with the event cursor instead of with however far
+            # behind the worker is. NBX may still index a tx between this
+            # response and the GET; its delta then gets counted twice, but the
+            # window is one round trip and the next block re-anchors it.
+            as_of_event_id = max(
+                (ev["eventId"] for ev in events if isinstance(ev.get("eventId"), int)), default=None
+            )
+            snapshot = {}
+            if first_response or new_block:
+                # Re-anchor the running balances on NBX's view after each block
+                snapshot = fetch_wallet_balances(http, wallet_urls)
+                # Unknown derivations are fetched again on their next tx
+                for deriv in balance_tracked - snapshot.keys():
+                    snapshot[deriv] = None
+                if first_response:
+                    loaded = sum(balance is not None for balance in snapshot.values())
+                    print(f"   Loaded starting balance for {loaded}/{len(deriv_to_wallet)} wallet(s)")
+                first_response = False
+            lazy_urls = {
+                deriv: urls for deriv, urls in pending_urls.items()
+                if deriv not in balance_tracked and deriv not in snapshot
+            }
+            # First tx of an untracked wallet: its fresh balance already
+            # includes every tx of this response
+            snapshot.update(fetch_wallet_balances(http, lazy_urls))
+            for deriv, balance in snapshot.items():
+                if balance is None:
+                    balance_tracked.discard(deriv)
+                else:
+                    balance_tracked.add(deriv)
+
+            if pending or snapshot:
+                enqueue_job(
+                    jobs,
+                    notify_batch,
+                    mailer,
+                    pgp_key,
+                    tz_offset,
+                    tz_label,
                     local_explorer,
                     public_explorer,
-                    txid,
-                    ending_balance_sats,
-                    utc_str,
-                    local_str,
-                    tz_label,
-                    note,
+                    snapshot,
+                    as_of_event_id,
+                    pending,
                 )
-
-                subject = f"[{wallet_name}] Transaction in Monitored Wallet"
-
-                print(f"[tx] id={ev.get('eventId')} wallet={wallet_name} dir={direction} amount={amount_sats} sats")
-                print(f"     txid={txid}")
-
-                send_email(config, subject, body)
-
-            elif etype == "newblock":
-                data = ev.get("data", {})
-                height = data.get("height")
-                blockhash = data.get("hash", "")[:16]
-                print(f"[block] height={height} hash={blockhash}...")
-            else:
-                print(f"[event] id={ev.get('eventId')} type={etype}")
     except KeyboardInterrupt:
         print("\nStopping nbx-txwatcher on user request (Ctrl+C).")
+    finally:
+        # Let already queued notifications go out before exiting
+        jobs.put(None)
+        worker.join()
+        mailer.close()
 
 if __name__ == "__main__":
     main()